@@ -2,70 +2,344 @@
 import sqlite3
 import json
 import os
-from datetime import datetime
-from typing import Optional, List, Dict
+import atexit
+import threading
+import time
+from typing import Optional, List, Dict, Tuple
 from contextlib import contextmanager
 
 
+# How long get_job_stats may serve a cached result. Writes made through this
+# instance invalidate it immediately; the TTL bounds staleness from writes
+# made by other processes (e.g. workers).
+STATS_CACHE_TTL = 1.0
+
+# Per-connection tuning applied to every connection. journal_mode=WAL is
+# persistent in the database file, so it is only set once in _init_db.
+CONNECTION_PRAGMAS = (
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA busy_timeout=10000",
+)
+
+# synchronous=NORMAL is durable enough under WAL. QUEUECTL_SYNCHRONOUS can
+# pick another level, e.g. OFF for throwaway test databases; it is never
+# the default, and unrecognised values fall back to NORMAL.
+SYNCHRONOUS_LEVELS = ("OFF", "NORMAL", "FULL", "EXTRA")
+DEFAULT_SYNCHRONOUS = "NORMAL"
+
+
+def _synchronous_pragma() -> str:
+    level = os.environ.get("QUEUECTL_SYNCHRONOUS", DEFAULT_SYNCHRONOUS).upper()
+    if level not in SYNCHRONOUS_LEVELS:
+        level = DEFAULT_SYNCHRONOUS
+    return f"PRAGMA synchronous={level}"
+
+
+# Hot-path statements, kept as constants so every call passes the same SQL
+# text and hits the connection's prepared statement cache.
+LOCK_JOB_SQL = """
+    UPDATE jobs 
+    SET state = 'processing', 
+        locked_by = ?,
+        locked_at = ?,
+        updated_at = ?,
+        retry_at = NULL
+    WHERE id = ? AND (state = 'pending' OR state = 'failed')
+"""
+
+# Pick the oldest failed job ready to retry, falling back to the oldest
+# pending job, and lock it in a single atomic statement. Each branch of the
+# UNION keeps its own ORDER BY/LIMIT so it can be answered from an index on
+# that state.
+DEQUEUE_JOB_SQL = """
+    UPDATE jobs 
+    SET state = 'processing',
+        locked_by = ?,
+        locked_at = ?,
+        updated_at = ?,
+        retry_at = NULL
+    WHERE id = (
+        SELECT id FROM (
+            SELECT * FROM (
+                SELECT id, 0 AS priority FROM jobs
+                WHERE state = 'failed' 
+                AND (retry_at IS NULL OR retry_at <= ?)
+                ORDER BY updated_at ASC 
+                LIMIT 1
+            )
+            UNION ALL
+            SELECT * FROM (
+                SELECT id, 1 AS priority FROM jobs
+                WHERE state = 'pending' 
+                ORDER BY created_at ASC 
+                LIMIT 1
+            )
+        )
+        ORDER BY priority
+        LIMIT 1
+    )
+    AND (state = 'pending' OR state = 'failed')
+    RETURNING *
+"""
+
+# Ready jobs in dequeue order (failed jobs due for retry first, then pending)
+# without locking them. updated_at identifies the version of the row that
+# was seen, so a later claim can tell whether the job changed since.
+READY_JOBS_SQL = """
+    SELECT id, updated_at FROM (
+        SELECT * FROM (
+            SELECT id, updated_at, 0 AS priority, updated_at AS position FROM jobs
+            WHERE state = 'failed' 
+            AND (retry_at IS NULL OR retry_at <= ?)
+            ORDER BY updated_at ASC 
+            LIMIT ?
+        )
+        UNION ALL
+        SELECT * FROM (
+            SELECT id, updated_at, 1 AS priority, created_at AS position FROM jobs
+            WHERE state = 'pending' 
+            ORDER BY created_at ASC 
+            LIMIT ?
+        )
+    )
+    ORDER BY priority, position
+    LIMIT ?
+"""
+
+# Lock a job only if it is still the version returned by READY_JOBS_SQL
+CLAIM_JOB_SQL = """
+    UPDATE jobs 
+    SET state = 'processing',
+        locked_by = ?,
+        locked_at = ?,
+        updated_at = ?,
+        retry_at = NULL
+    WHERE id = ? AND updated_at = ?
+    AND (state = 'pending' OR state = 'failed')
+    RETURNING *
+"""
+
+# attempts is left unchanged when NULL is passed; retry_at is always set
+UPDATE_JOB_STATE_SQL = """
+    UPDATE jobs 
+    SET state = ?, attempts = COALESCE(?, attempts), updated_at = ?,
+        locked_by = NULL, locked_at = NULL, retry_at = ?
+    WHERE id = ?
+"""
+
+
+# Bumped whenever _create_schema gains a migration. Databases created before
+# user_version was tracked report 0.
+SCHEMA_VERSION = 2
+
+CREATE_JOBS_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY,
+        command TEXT NOT NULL,
+        state TEXT NOT NULL,
+        attempts INTEGER DEFAULT 0,
+        max_retries INTEGER DEFAULT 3,
+        created_at INTEGER NOT NULL,
+        updated_at INTEGER NOT NULL,
+        locked_by TEXT,
+        locked_at INTEGER,
+        retry_at INTEGER
+    )
+"""
+
+
+# Column lists for list_jobs(projection=...), producing display-ready rows:
+# commands truncated to 50 characters and timestamps as ISO-8601 UTC
+_COMMAND_COLUMN = "CASE WHEN length(command) > 50 THEN substr(command, 1, 50) || '...' ELSE command END"
+
+
+def _timestamp_column(column: str) -> str:
+    return f"strftime('%Y-%m-%dT%H:%M:%SZ', {column} / 1000, 'unixepoch')"
+
+
+LIST_PROJECTIONS = {
+    "table": f"""id, {_COMMAND_COLUMN}, state, attempts || '/' || max_retries,
+                 {_timestamp_column("created_at")}""",
+    "dlq": f"""id, {_COMMAND_COLUMN}, attempts,
+               {_timestamp_column("created_at")}, {_timestamp_column("updated_at")}""",
+}
+
+
+def now_ms() -> int:
+    """Current time as integer Unix milliseconds, the format of all job timestamps."""
+    return time.time_ns() // 1_000_000
+
+
+def _iso_to_ms_sql(column: str) -> str:
+    """SQL expression converting an ISO-8601 TEXT column to Unix milliseconds."""
+    return f"CAST(ROUND((julianday({column}) - 2440587.5) * 86400000) AS INTEGER)"
+
+
+# Connections return plain tuples; rows are turned into dicts by zipping them
+# with the column names, looked up once per query rather than per column.
+def _fetchone_as_dict(cursor: sqlite3.Cursor) -> Optional[Dict]:
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    return dict(zip([col[0] for col in cursor.description], row))
+
+
+def _fetchall_as_dicts(cursor: sqlite3.Cursor) -> List[Dict]:
+    columns = [col[0] for col in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
 class JobStorage:
     """Manages persistent job storage using SQLite."""
     
     def __init__(self, db_path: str = "queuectl.db"):
         self.db_path = db_path
+        self._local = threading.local()
+        self._stats_cache = None
+        self._stats_version = 0
+        self._config_cache: Dict[str, str] = {}
+        self._initialized = False
         self._init_db()
+        atexit.register(self.close)
     
     def _init_db(self):
-        """Initialize the database schema."""
+        """Initialize the database schema.
+        
+        Setup and migrations only run while PRAGMA user_version is below
+        SCHEMA_VERSION, so opening an up-to-date database is a single read.
+        """
+        if self._initialized:
+            return
+        
         with self._get_connection() as conn:
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS jobs (
-                    id TEXT PRIMARY KEY,
-                    command TEXT NOT NULL,
-                    state TEXT NOT NULL,
-                    attempts INTEGER DEFAULT 0,
-                    max_retries INTEGER DEFAULT 3,
-                    created_at TEXT NOT NULL,
-                    updated_at TEXT NOT NULL,
-                    locked_by TEXT,
-                    locked_at TEXT
-                )
-            """)
-            
-            # Add retry_at column if it doesn't exist (migration)
-            try:
-                conn.execute("ALTER TABLE jobs ADD COLUMN retry_at TEXT")
-            except sqlite3.OperationalError:
-                pass  # Column already exists
-            
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS config (
-                    key TEXT PRIMARY KEY,
-                    value TEXT NOT NULL
-                )
-            """)
-            
-            # Initialize default config
-            conn.execute("""
-                INSERT OR IGNORE INTO config (key, value) VALUES
-                ('max_retries', '3'),
-                ('backoff_base', '2')
-            """)
+            # WAL lets workers read while another worker writes, and with
+            # synchronous=NORMAL commits no longer fsync on every transition
+            conn.execute("PRAGMA journal_mode=WAL")
             
-            conn.commit()
+            current = self._schema_version(conn) >= SCHEMA_VERSION
+        
+        if not current:
+            with self._get_connection(write=True) as conn:
+                # Re-check under the write lock in case another process
+                # migrated the database in the meantime
+                if self._schema_version(conn) < SCHEMA_VERSION:
+                    self._create_schema(conn)
+                    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        
+        self._initialized = True
+    
+    @staticmethod
+    def _schema_version(conn: sqlite3.Connection) -> int:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+    
+    def _create_schema(self, conn: sqlite3.Connection):
+        """Create missing tables and indexes, migrating older layouts."""
+        conn.execute(CREATE_JOBS_TABLE_SQL)
+        self._migrate_integer_timestamps(conn)
+        
+        # (state, created_at) serves the pending dequeue branch, list_jobs
+        # and get_job_stats; (state, updated_at) serves the failed branch,
+        # which is dequeued in updated_at order. The planner only picked the
+        # earlier partial index on failed jobs once ANALYZE had run.
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_jobs_state
+            ON jobs (state, created_at)
+        """)
+        conn.execute("DROP INDEX IF EXISTS idx_jobs_failed_retry")
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_jobs_state_updated
+            ON jobs (state, updated_at)
+        """)
+        
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS config (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            )
+        """)
+        
+        # Initialize default config
+        conn.execute("""
+            INSERT OR IGNORE INTO config (key, value) VALUES
+            ('max_retries', '3'),
+            ('backoff_base', '2')
+        """)
+    
+    def _migrate_integer_timestamps(self, conn: sqlite3.Connection):
+        """Rebuild a jobs table created with ISO-8601 TEXT timestamps.
+        
+        Column types can't be altered in place, and TEXT affinity would store
+        the new integer timestamps as strings, so the table is recreated.
+        """
+        columns = {row[1]: row[2] for row in conn.execute("PRAGMA table_info(jobs)")}
+        if columns["created_at"].upper() != "TEXT":
+            return
+        
+        if "retry_at" not in columns:
+            conn.execute("ALTER TABLE jobs ADD COLUMN retry_at TEXT")
+        conn.execute("ALTER TABLE jobs RENAME TO jobs_old")
+        conn.execute(CREATE_JOBS_TABLE_SQL)
+        conn.execute(f"""
+            INSERT INTO jobs
+            SELECT id, command, state, attempts, max_retries,
+                   {_iso_to_ms_sql("created_at")},
+                   {_iso_to_ms_sql("updated_at")},
+                   locked_by,
+                   {_iso_to_ms_sql("locked_at")},
+                   {_iso_to_ms_sql("retry_at")}
+            FROM jobs_old
+        """)
+        conn.execute("DROP TABLE jobs_old")
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Get this thread's pooled connection, opening it on first use.
+        
+        Connections are never shared across threads or processes. A worker
+        forked from the CLI inherits the parent's connection object, so the
+        owning PID is checked and a fresh connection is opened in the child.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            # Autocommit mode: _get_connection issues BEGIN/COMMIT itself
+            conn = sqlite3.connect(self.db_path, timeout=10.0, cached_statements=256, isolation_level=None)
+            for pragma in CONNECTION_PRAGMAS:
+                conn.execute(pragma)
+            conn.execute(_synchronous_pragma())
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
     
     @contextmanager
-    def _get_connection(self):
-        """Get a database connection with proper transaction handling."""
-        conn = sqlite3.connect(self.db_path, timeout=10.0)
-        conn.row_factory = sqlite3.Row
+    def _get_connection(self, write: bool = False):
+        """Get a database connection with proper transaction handling.
+        
+        Writes run in a BEGIN IMMEDIATE transaction, taking the write lock up
+        front instead of upgrading a read lock mid-transaction, which is what
+        makes concurrent workers hit SQLITE_BUSY. Reads are single statements
+        and run in autocommit mode. Nested use joins the open transaction.
+        """
+        conn = self._connect()
+        if not write or conn.in_transaction:
+            yield conn
+            return
+        
+        conn.execute("BEGIN IMMEDIATE")
         try:
             yield conn
-            conn.commit()
-        except Exception:
-            conn.rollback()
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
             raise
-        finally:
+    
+    def close(self):
+        """Close this thread's pooled connection, if one is open."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
             conn.close()
+        self._local.conn = None
     
     def create_job(self, job_id: str, command: str, max_retries: Optional[int] = None) -> Dict:
         """Create a new job."""
@@ -73,7 +347,7 @@ class JobStorage:
         if max_retries is None:
             max_retries = int(self.get_config("max_retries", "3"))
         
-        now = datetime.utcnow().isoformat() + "Z"
+        now = now_ms()
         job = {
             "id": job_id,
             "command": command,
@@ -84,7 +358,8 @@ class JobStorage:
             "updated_at": now
         }
         
-        with self._get_connection() as conn:
+        self._stats_version += 1
+        with self._get_connection(write=True) as conn:
             conn.execute("""
                 INSERT INTO jobs (id, command, state, attempts, max_retries, created_at, updated_at)
                 VALUES (?, ?, ?, ?, ?, ?, ?)
@@ -100,14 +375,38 @@ class JobStorage:
         
         return job
     
+    def create_jobs_bulk(self, jobs: List[Dict]) -> List[Dict]:
+        """Create many jobs in a single write transaction.
+        
+        Each entry needs "id" and "command"; "max_retries" falls back to
+        the config default. A duplicate id rolls back the whole batch.
+        """
+        default_retries = int(self.get_config("max_retries", "3"))
+        now = now_ms()
+        created = [{
+            "id": job["id"],
+            "command": job["command"],
+            "state": "pending",
+            "attempts": 0,
+            "max_retries": job.get("max_retries") if job.get("max_retries") is not None else default_retries,
+            "created_at": now,
+            "updated_at": now
+        } for job in jobs]
+        
+        self._stats_version += 1
+        with self._get_connection(write=True) as conn:
+            conn.executemany("""
+                INSERT INTO jobs (id, command, state, attempts, max_retries, created_at, updated_at)
+                VALUES (:id, :command, :state, :attempts, :max_retries, :created_at, :updated_at)
+            """, created)
+        
+        return created
+    
     def get_job(self, job_id: str) -> Optional[Dict]:
         """Get a job by ID."""
         with self._get_connection() as conn:
             cursor = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
-            row = cursor.fetchone()
-            if row:
-                return dict(row)
-        return None
+            return _fetchone_as_dict(cursor)
     
     def lock_job(self, job_id: str, worker_id: str) -> bool:
         """Try to lock a pending or failed job for processing. Returns True if locked successfully.
@@ -115,147 +414,120 @@ class JobStorage:
         Uses atomic UPDATE with WHERE clause to prevent race conditions.
         Only one worker can successfully lock a job at a time.
         """
-        with self._get_connection() as conn:
-            now = datetime.utcnow().isoformat() + "Z"
+        self._stats_version += 1
+        with self._get_connection(write=True) as conn:
+            now = now_ms()
             # Try to lock a pending or failed job atomically
             # The WHERE clause ensures only one worker can lock the job
-            cursor = conn.execute("""
-                UPDATE jobs 
-                SET state = 'processing', 
-                    locked_by = ?,
-                    locked_at = ?,
-                    updated_at = ?,
-                    retry_at = NULL
-                WHERE id = ? AND (state = 'pending' OR state = 'failed')
-            """, (worker_id, now, now, job_id))
+            cursor = conn.execute(LOCK_JOB_SQL, (worker_id, now, now, job_id))
             
             return cursor.rowcount > 0
     
     def get_next_pending_job(self, worker_id: str) -> Optional[Dict]:
         """Get and lock the next pending job or failed job ready for retry.
         
-        Uses atomic UPDATE with subquery to prevent race conditions.
+        Uses a single atomic UPDATE ... RETURNING (SQLite 3.35+) to select,
+        lock and read the job back, preventing race conditions.
         Only one worker can successfully lock a job at a time.
         """
-        with self._get_connection() as conn:
-            now = datetime.utcnow().isoformat() + "Z"
-            
-            # First, try to atomically lock a failed job ready to retry
-            # This UPDATE is atomic and prevents race conditions between workers
-            cursor = conn.execute("""
-                UPDATE jobs 
-                SET state = 'processing',
-                    locked_by = ?,
-                    locked_at = ?,
-                    updated_at = ?,
-                    retry_at = NULL
-                WHERE id IN (
-                    SELECT id FROM jobs
-                    WHERE state = 'failed' 
-                    AND (retry_at IS NULL OR retry_at <= ?)
-                    ORDER BY updated_at ASC 
-                    LIMIT 1
-                )
-                AND state = 'failed'
-            """, (worker_id, now, now, now))
-            
-            if cursor.rowcount > 0:
-                # Get the job we just locked
-                cursor = conn.execute("""
-                    SELECT * FROM jobs 
-                    WHERE locked_by = ? AND state = 'processing'
-                    ORDER BY locked_at DESC
-                    LIMIT 1
-                """, (worker_id,))
-                row = cursor.fetchone()
-                if row:
-                    return dict(row)
-            
-            # If no failed jobs ready, atomically lock a pending job
-            cursor = conn.execute("""
-                UPDATE jobs 
-                SET state = 'processing',
-                    locked_by = ?,
-                    locked_at = ?,
-                    updated_at = ?,
-                    retry_at = NULL
-                WHERE id IN (
-                    SELECT id FROM jobs
-                    WHERE state = 'pending' 
-                    ORDER BY created_at ASC 
-                    LIMIT 1
-                )
-                AND state = 'pending'
-            """, (worker_id, now, now))
-            
-            if cursor.rowcount > 0:
-                # Get the job we just locked
-                cursor = conn.execute("""
-                    SELECT * FROM jobs 
-                    WHERE locked_by = ? AND state = 'processing'
-                    ORDER BY locked_at DESC
-                    LIMIT 1
-                """, (worker_id,))
-                row = cursor.fetchone()
-                if row:
-                    return dict(row)
-        
-        return None
+        self._stats_version += 1
+        with self._get_connection(write=True) as conn:
+            now = now_ms()
+            cursor = conn.execute(DEQUEUE_JOB_SQL, (worker_id, now, now, now))
+            return _fetchone_as_dict(cursor)
     
-    def update_job_state(self, job_id: str, state: str, attempts: Optional[int] = None, retry_at: Optional[str] = None):
-        """Update job state and optionally attempts and retry_at."""
-        now = datetime.utcnow().isoformat() + "Z"
+    def list_ready_jobs(self, limit: int) -> List[Tuple[str, int]]:
+        """List up to limit (id, updated_at) pairs of jobs ready to run, in dequeue order.
         
+        Nothing is locked; pass a pair to claim_job to take the job.
+        """
         with self._get_connection() as conn:
-            if attempts is not None and retry_at is not None:
-                conn.execute("""
-                    UPDATE jobs 
-                    SET state = ?, attempts = ?, updated_at = ?, locked_by = NULL, locked_at = NULL, retry_at = ?
-                    WHERE id = ?
-                """, (state, attempts, now, retry_at, job_id))
-            elif attempts is not None:
-                conn.execute("""
-                    UPDATE jobs 
-                    SET state = ?, attempts = ?, updated_at = ?, locked_by = NULL, locked_at = NULL, retry_at = NULL
-                    WHERE id = ?
-                """, (state, attempts, now, job_id))
-            elif retry_at is not None:
-                conn.execute("""
-                    UPDATE jobs 
-                    SET state = ?, updated_at = ?, locked_by = NULL, locked_at = NULL, retry_at = ?
-                    WHERE id = ?
-                """, (state, now, retry_at, job_id))
-            else:
-                conn.execute("""
-                    UPDATE jobs 
-                    SET state = ?, updated_at = ?, locked_by = NULL, locked_at = NULL, retry_at = NULL
-                    WHERE id = ?
-                """, (state, now, job_id))
+            cursor = conn.execute(READY_JOBS_SQL, (now_ms(), limit, limit, limit))
+            return cursor.fetchall()
     
-    def increment_attempts(self, job_id: str) -> int:
-        """Increment job attempts and return new count."""
+    def get_ready_versions(self, job_ids: List[str]) -> Dict[str, int]:
+        """Return {id: updated_at} for those of job_ids still pending or failed."""
+        if not job_ids:
+            return {}
+        placeholders = ",".join("?" * len(job_ids))
         with self._get_connection() as conn:
-            conn.execute("""
-                UPDATE jobs 
-                SET attempts = attempts + 1, updated_at = ?
+            cursor = conn.execute(f"""
+                SELECT id, updated_at FROM jobs
+                WHERE id IN ({placeholders}) AND (state = 'pending' OR state = 'failed')
+            """, job_ids)
+            return dict(cursor.fetchall())
+    
+    def claim_job(self, job_id: str, updated_at: int, worker_id: str) -> Optional[Dict]:
+        """Lock a job listed by list_ready_jobs and return it.
+        
+        Returns None if another worker claimed it first or the job changed
+        since it was listed.
+        """
+        self._stats_version += 1
+        with self._get_connection(write=True) as conn:
+            now = now_ms()
+            cursor = conn.execute(CLAIM_JOB_SQL, (worker_id, now, now, job_id, updated_at))
+            return _fetchone_as_dict(cursor)
+    
+    def update_job_state(self, job_id: str, state: str, attempts: Optional[int] = None, retry_at: Optional[int] = None):
+        """Update job state and optionally attempts and retry_at (Unix millis)."""
+        now = now_ms()
+        
+        self._stats_version += 1
+        with self._get_connection(write=True) as conn:
+            conn.execute(UPDATE_JOB_STATE_SQL, (state, attempts, now, retry_at, job_id))
+    
+    def fail_job(self, job_id: str, retry_at_if_failed: int) -> Optional[Tuple[int, str]]:
+        """Record a failed attempt in one write.
+        
+        Increments attempts and moves the job to "dead" once max_retries is
+        reached, otherwise to "failed" with retry_at_if_failed. Returns the
+        new (attempts, state), or None if the job doesn't exist.
+        """
+        self._stats_version += 1
+        with self._get_connection(write=True) as conn:
+            cursor = conn.execute("""
+                UPDATE jobs
+                SET attempts = attempts + 1,
+                    state = CASE WHEN attempts + 1 >= max_retries THEN 'dead' ELSE 'failed' END,
+                    retry_at = CASE WHEN attempts + 1 >= max_retries THEN NULL ELSE ? END,
+                    locked_by = NULL, locked_at = NULL, updated_at = ?
                 WHERE id = ?
-            """, (datetime.utcnow().isoformat() + "Z", job_id))
+                RETURNING attempts, state
+            """, (retry_at_if_failed, now_ms(), job_id))
             
-            job = self.get_job(job_id)
-            return job["attempts"] if job else 0
+            row = cursor.fetchone()
+            return (row[0], row[1]) if row else None
     
-    def list_jobs(self, state: Optional[str] = None) -> List[Dict]:
-        """List jobs, optionally filtered by state."""
+    def list_jobs(self, state: Optional[str] = None, projection: Optional[str] = None) -> List:
+        """List jobs, optionally filtered by state.
+        
+        Returns dicts of all columns, or with projection (a LIST_PROJECTIONS
+        key) tuples formatted for display by SQLite.
+        """
+        columns = LIST_PROJECTIONS[projection] if projection else "*"
         with self._get_connection() as conn:
             if state:
-                cursor = conn.execute("SELECT * FROM jobs WHERE state = ? ORDER BY created_at DESC", (state,))
+                cursor = conn.execute(f"SELECT {columns} FROM jobs WHERE state = ? ORDER BY created_at DESC", (state,))
             else:
-                cursor = conn.execute("SELECT * FROM jobs ORDER BY created_at DESC")
+                cursor = conn.execute(f"SELECT {columns} FROM jobs ORDER BY created_at DESC")
             
-            return [dict(row) for row in cursor.fetchall()]
+            if projection:
+                return cursor.fetchall()
+            return _fetchall_as_dicts(cursor)
     
     def get_job_stats(self) -> Dict[str, int]:
-        """Get statistics about job states."""
+        """Get statistics about job states.
+        
+        Results are cached until this instance changes a job's state or
+        STATS_CACHE_TTL seconds pass, whichever comes first.
+        """
+        if self._stats_cache is not None:
+            version, cached_at, stats = self._stats_cache
+            if version == self._stats_version and time.monotonic() - cached_at < STATS_CACHE_TTL:
+                return dict(stats)
+        
+        version = self._stats_version
         with self._get_connection() as conn:
             cursor = conn.execute("""
                 SELECT state, COUNT(*) as count 
@@ -263,26 +535,38 @@ class JobStorage:
                 GROUP BY state
             """)
             
-            stats = {row["state"]: row["count"] for row in cursor.fetchall()}
+            stats = dict(cursor.fetchall())
             
             # Ensure all states are present
             for state in ["pending", "processing", "completed", "failed", "dead"]:
                 if state not in stats:
                     stats[state] = 0
-            
-            return stats
+        
+        self._stats_cache = (version, time.monotonic(), stats)
+        return dict(stats)
     
     def get_config(self, key: str, default: str = None) -> Optional[str]:
-        """Get configuration value."""
+        """Get configuration value.
+        
+        Values are cached per instance; set_config keeps the cache current.
+        """
+        if key in self._config_cache:
+            return self._config_cache[key]
+        
         with self._get_connection() as conn:
             cursor = conn.execute("SELECT value FROM config WHERE key = ?", (key,))
             row = cursor.fetchone()
-            return row["value"] if row else default
+        
+        if row is None:
+            return default
+        self._config_cache[key] = row[0]
+        return row[0]
     
     def set_config(self, key: str, value: str):
         """Set configuration value."""
-        with self._get_connection() as conn:
+        with self._get_connection(write=True) as conn:
             conn.execute("""
                 INSERT OR REPLACE INTO config (key, value) VALUES (?, ?)
             """, (key, value))
+        self._config_cache[key] = value
 
@@ -1,52 +1,248 @@
 """Worker process implementation."""
 import subprocess
 import time
+import re
+import shlex
+import select
 import signal
 import sys
 import os
-from datetime import datetime
-from typing import Optional
-from .storage import JobStorage
+import queue
+import threading
+from typing import Dict, List, Optional
+from .storage import JobStorage, now_ms
+
+
+# Idle workers back off from IDLE_SLEEP_MIN up to IDLE_SLEEP_MAX seconds
+# between polls, and are woken early through the notify FIFO on enqueue.
+IDLE_SLEEP_MIN = 0.05
+IDLE_SLEEP_MAX = 2.0
+
+# Commands using any shell syntax, or starting with a shell builtin or a
+# variable assignment, still run through the shell; anything else is exec'd
+# directly, saving the intermediate /bin/sh process.
+SHELL_METACHARS = re.compile(r"""[|&;<>()$`\\"'*?~#\[\]{}!\n]""")
+SHELL_BUILTINS = frozenset({
+    ".", ":", "alias", "bg", "break", "cd", "command", "continue", "eval",
+    "exec", "exit", "export", "fg", "getopts", "hash", "jobs", "local",
+    "read", "readonly", "return", "set", "shift", "source", "times", "trap",
+    "type", "ulimit", "umask", "unalias", "unset", "wait",
+})
+
+# Only the tail of a job's stderr is kept for the failure log; stdout is
+# discarded so chatty jobs can't grow the worker's memory.
+OUTPUT_LIMIT = 8192
+
+# A command, and anything it leaves holding its stderr, gets 5 minutes
+COMMAND_TIMEOUT = 300
+
+
+def split_command(command: str) -> Optional[List[str]]:
+    """Split a command into argv if it can run without a shell, else None."""
+    if os.name == "nt" or SHELL_METACHARS.search(command):
+        return None
+    
+    argv = shlex.split(command)
+    if not argv or "=" in argv[0] or argv[0] in SHELL_BUILTINS:
+        return None
+    return argv
+
+
+def _read_tail(stream, tail: bytearray, limit: int):
+    """Drain stream, keeping only its last limit bytes in tail."""
+    for chunk in iter(lambda: stream.read1(4096), b""):
+        tail += chunk
+        if len(tail) > limit:
+            del tail[:-limit]
+
+
+def _signal_command(proc: subprocess.Popen, kill: bool = False):
+    """Terminate (or kill) a command along with any processes it started.
+    
+    Commands run in their own session, so signalling the process group also
+    reaches a shell's children, which may still hold the stderr pipe.
+    """
+    if os.name == "nt":
+        proc.kill() if kill else proc.terminate()
+        return
+    
+    try:
+        os.killpg(proc.pid, signal.SIGKILL if kill else signal.SIGTERM)
+    except ProcessLookupError:
+        pass  # The command and all of its children have exited
+
+
+def notify_path(db_path: str) -> str:
+    """Path of the FIFO used to wake workers polling db_path."""
+    return db_path + ".notify"
+
+
+def notify_workers(db_path: str):
+    """Wake an idle worker polling db_path, if any are listening."""
+    if not hasattr(os, "mkfifo"):
+        return  # No FIFOs (Windows); workers fall back to polling
+    
+    try:
+        fd = os.open(notify_path(db_path), os.O_WRONLY | os.O_NONBLOCK)
+    except OSError:
+        return  # No workers have created or opened the FIFO
+    
+    try:
+        os.write(fd, b"\0")
+    except BlockingIOError:
+        pass  # FIFO is full, so a wake-up is already pending
+    finally:
+        os.close(fd)
+
+
+def open_notify_fifo(db_path: str) -> Optional[int]:
+    """Create and open the notify FIFO for db_path. Returns None if unavailable."""
+    if not hasattr(os, "mkfifo"):
+        return None
+    
+    path = notify_path(db_path)
+    try:
+        os.mkfifo(path)
+    except FileExistsError:
+        pass
+    except OSError:
+        return None
+    
+    try:
+        # Open read-write so the FIFO always has a writer; otherwise
+        # select() reports EOF immediately whenever nobody is enqueueing
+        return os.open(path, os.O_RDWR | os.O_NONBLOCK)
+    except OSError:
+        return None
+
+
+def wait_for_notify(fd: Optional[int], timeout: float):
+    """Sleep until a job is enqueued (fd becomes readable) or timeout elapses."""
+    if fd is None:
+        time.sleep(timeout)
+        return
+    
+    readable, _, _ = select.select([fd], [], [], timeout)
+    if readable:
+        try:
+            os.read(fd, 1)
+        except BlockingIOError:
+            pass  # Another process consumed the wake-up
 
 
 class Worker:
-    """Worker process that executes jobs."""
+    """Worker process that executes jobs.
+    
+    Jobs come from job_queue when running under a Dispatcher; without one
+    the worker polls storage itself.
+    """
     
-    def __init__(self, worker_id: str, storage: JobStorage, backoff_base: float = 2.0):
+    def __init__(self, worker_id: str, storage: JobStorage, backoff_base: float = 2.0, job_queue=None):
         self.worker_id = worker_id
         self.storage = storage
         self.backoff_base = backoff_base
+        self.job_queue = job_queue
         self.running = True
         self.current_job = None
+        self._current_proc = None
+        self._idle_sleep = IDLE_SLEEP_MIN
+        self._notify_fd = open_notify_fifo(storage.db_path) if job_queue is None else None
         
-        # Setup signal handlers for graceful shutdown
-        signal.signal(signal.SIGINT, self._signal_handler)
-        signal.signal(signal.SIGTERM, self._signal_handler)
+        # Setup signal handlers for graceful shutdown (only possible, and
+        # only meaningful, in the process's main thread)
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGINT, self._signal_handler)
+            signal.signal(signal.SIGTERM, self._signal_handler)
     
     def _signal_handler(self, signum, frame):
-        """Handle shutdown signals gracefully."""
-        print(f"\n[Worker {self.worker_id}] Received shutdown signal. Finishing current job...")
+        """Handle shutdown signals gracefully.
+        
+        A running command is terminated so shutdown doesn't wait out the
+        command timeout; its job is returned to pending by process_job.
+        """
+        print(f"\n[Worker {self.worker_id}] Received shutdown signal. Stopping current job...")
+        proc = self._current_proc
+        if proc is not None:
+            # Even if the command itself has exited, its children may still
+            # be holding stderr open
+            _signal_command(proc)
         self.running = False
     
+    def _next_job(self) -> Optional[dict]:
+        """Get the next job to run, or None if none arrived in time."""
+        if self.job_queue is not None:
+            try:
+                job_id, updated_at = self.job_queue.get(timeout=1)
+            except queue.Empty:
+                return None
+            if not self.running:
+                return None  # Still pending; left for the next start
+            # None if another worker got there first or the job changed
+            return self.storage.claim_job(job_id, updated_at, self.worker_id)
+        
+        job = self.storage.get_next_pending_job(self.worker_id)
+        if job:
+            self._idle_sleep = IDLE_SLEEP_MIN
+        else:
+            # No jobs available, back off until woken or timed out
+            wait_for_notify(self._notify_fd, self._idle_sleep)
+            self._idle_sleep = min(self._idle_sleep * 1.5, IDLE_SLEEP_MAX)
+        return job
+    
     def _calculate_backoff(self, attempts: int) -> float:
         """Calculate exponential backoff delay."""
         return self.backoff_base ** attempts
     
     def _execute_command(self, command: str):
-        """Execute a shell command and return (success, output)."""
+        """Execute a shell command and return (success, output).
+        
+        Output is the last OUTPUT_LIMIT bytes of the command's stderr.
+        """
+        argv = split_command(command)
         try:
-            result = subprocess.run(
-                command,
-                shell=True,
-                capture_output=True,
-                text=True,
-                timeout=300  # 5 minute timeout
+            proc = subprocess.Popen(
+                command if argv is None else argv,
+                shell=argv is None,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+                start_new_session=os.name != "nt"
             )
-            return result.returncode == 0, result.stdout + result.stderr
-        except subprocess.TimeoutExpired:
-            return False, "Command timed out after 5 minutes"
         except Exception as e:
             return False, str(e)
+        
+        deadline = time.monotonic() + COMMAND_TIMEOUT
+        self._current_proc = proc
+        if not self.running:
+            # The shutdown signal landed before _current_proc was set
+            _signal_command(proc)
+        tail = bytearray()
+        reader = threading.Thread(target=_read_tail, args=(proc.stderr, tail, OUTPUT_LIMIT), daemon=True)
+        reader.start()
+        
+        try:
+            try:
+                returncode = proc.wait(timeout=COMMAND_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                _signal_command(proc, kill=True)
+                proc.wait()
+                reader.join(timeout=1)
+                return False, "Command timed out after 5 minutes"
+            
+            # Background children of the command may keep stderr open past
+            # its exit; wait for them within the same deadline, or only
+            # briefly once shutdown has signalled them
+            if self.running:
+                reader.join(timeout=max(0.0, deadline - time.monotonic()))
+            if reader.is_alive():
+                reader.join(timeout=1)
+        finally:
+            self._current_proc = None
+        
+        # Closing the pipe blocks while the reader is still in read1(), so
+        # leave it to the daemon thread if something still holds it open
+        if not reader.is_alive():
+            proc.stderr.close()
+        return returncode == 0, bytes(tail).decode(errors="replace")
     
     def process_job(self, job: dict) -> bool:
         """Process a single job. Returns True if job was processed successfully."""
@@ -65,26 +261,26 @@ class Worker:
             self.storage.update_job_state(job_id, "completed")
             print(f"[Worker {self.worker_id}] Job {job_id} completed successfully")
             return True
+        elif not self.running:
+            # Interrupted by shutdown; don't count it as an attempt
+            self.storage.update_job_state(job_id, "pending")
+            print(f"[Worker {self.worker_id}] Job {job_id} interrupted, returned to pending")
+            return False
         else:
-            # Job failed
-            new_attempts = self.storage.increment_attempts(job_id)
+            # Job failed. The backoff depends on the attempt count after this
+            # failure, which is known up front since the job is locked to us.
+            delay = self._calculate_backoff(attempts + 1)
+            retry_at = now_ms() + int(delay * 1000)
+            result = self.storage.fail_job(job_id, retry_at)
+            if result is None:
+                print(f"[Worker {self.worker_id}] Job {job_id} failed but no longer exists")
+                return False
+            new_attempts, new_state = result
             print(f"[Worker {self.worker_id}] Job {job_id} failed (attempt {new_attempts}/{max_retries}): {output[:100]}")
             
-            if new_attempts >= max_retries:
-                # Move to DLQ
-                self.storage.update_job_state(job_id, "dead")
+            if new_state == "dead":
                 print(f"[Worker {self.worker_id}] Job {job_id} moved to DLQ after {new_attempts} attempts")
             else:
-                # Mark as failed for retry
-                # Calculate backoff delay
-                delay = self._calculate_backoff(new_attempts)
-                # Calculate retry time
-                retry_time = datetime.utcnow()
-                retry_time = retry_time.replace(microsecond=0)
-                retry_time = retry_time.timestamp() + delay
-                retry_at = datetime.fromtimestamp(retry_time).isoformat() + "Z"
-                
-                self.storage.update_job_state(job_id, "failed", retry_at=retry_at)
                 print(f"[Worker {self.worker_id}] Job {job_id} will retry after {delay:.2f} seconds")
             
             return False
@@ -94,54 +290,168 @@ class Worker:
         print(f"[Worker {self.worker_id}] Started")
         
         while self.running:
-            # Get next pending job
-            job = self.storage.get_next_pending_job(self.worker_id)
+            job = self._next_job()
+            
+            if job and not self.running:
+                # Shutdown was requested while waiting for this job, before
+                # its command could be terminated; leave it for a restart
+                self.storage.update_job_state(job["id"], "pending")
+                print(f"[Worker {self.worker_id}] Job {job['id']} returned to pending")
+                break
             
             if job:
                 self.current_job = job
                 self.process_job(job)
                 self.current_job = None
-            else:
-                # No jobs available, wait a bit
-                time.sleep(0.5)
         
         # If we have a current job, finish it before exiting
         if self.current_job:
             print(f"[Worker {self.worker_id}] Finishing current job before shutdown...")
             self.process_job(self.current_job)
         
+        if self._notify_fd is not None:
+            os.close(self._notify_fd)
+        
         print(f"[Worker {self.worker_id}] Stopped")
 
 
+class Dispatcher:
+    """Finds ready jobs in storage and hands their ids to workers over a queue.
+    
+    A single dispatcher polls the database on behalf of all workers, so
+    dequeue contention doesn't grow with the number of workers. It never
+    locks jobs: each worker claims the job it receives, so queued jobs stay
+    pending and nothing is stranded if the dispatcher dies.
+    """
+    
+    def __init__(self, storage: JobStorage, job_queue, batch_size: int):
+        self.storage = storage
+        self.job_queue = job_queue
+        self.batch_size = batch_size
+        self.running = True
+        self._idle_sleep = IDLE_SLEEP_MIN
+        self._notify_fd = open_notify_fifo(storage.db_path)
+        # id -> updated_at of jobs handed off that no worker has claimed yet
+        self._queued: Dict[str, int] = {}
+        
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGINT, self._signal_handler)
+            signal.signal(signal.SIGTERM, self._signal_handler)
+    
+    def _signal_handler(self, signum, frame):
+        """Handle shutdown signals gracefully."""
+        self.running = False
+    
+    def _hand_off(self, job_id: str, updated_at: int) -> bool:
+        """Queue a job for the workers. Returns False if shut down while waiting."""
+        while self.running:
+            try:
+                self.job_queue.put((job_id, updated_at), timeout=0.5)
+                return True
+            except queue.Full:
+                pass
+        return False
+    
+    def _unclaimed(self) -> Dict[str, int]:
+        """Forget queued jobs that have been claimed or changed since."""
+        current = self.storage.get_ready_versions(list(self._queued))
+        self._queued = {
+            job_id: updated_at for job_id, updated_at in self._queued.items()
+            if current.get(job_id) == updated_at
+        }
+        return self._queued
+    
+    def run(self):
+        """Main dispatcher loop."""
+        print("[Dispatcher] Started")
+        
+        while self.running:
+            queued = self._unclaimed()
+            ready = self.storage.list_ready_jobs(len(queued) + self.batch_size)
+            fresh = [(job_id, updated_at) for job_id, updated_at in ready
+                     if queued.get(job_id) != updated_at]
+            
+            if fresh:
+                self._idle_sleep = IDLE_SLEEP_MIN
+                for job_id, updated_at in fresh:
+                    if not self._hand_off(job_id, updated_at):
+                        break
+                    queued[job_id] = updated_at
+            else:
+                wait_for_notify(self._notify_fd, self._idle_sleep)
+                self._idle_sleep = min(self._idle_sleep * 1.5, IDLE_SLEEP_MAX)
+        
+        if self._notify_fd is not None:
+            os.close(self._notify_fd)
+        
+        print("[Dispatcher] Stopped")
+
+
+def _dispatcher_process(db_path: str, job_queue, batch_size: int):
+    """Dispatcher process entry point."""
+    Dispatcher(JobStorage(db_path), job_queue, batch_size).run()
+
+
+def _worker_process(db_path: str, worker_id: str, backoff_base: float, job_queue):
+    """Worker process entry point."""
+    worker = Worker(worker_id, JobStorage(db_path), backoff_base, job_queue)
+    worker.run()
+
+
 class WorkerManager:
-    """Manages multiple worker processes."""
+    """Manages a dispatcher process and multiple worker processes."""
     
     def __init__(self, storage: JobStorage):
         self.storage = storage
         self.workers = []
         self.processes = []
+        self.dispatcher = None
+        self.job_queue = None
     
     def start_workers(self, count: int):
-        """Start multiple worker processes."""
+        """Start a dispatcher and multiple worker processes fed by it."""
         import multiprocessing
         
         backoff_base = float(self.storage.get_config("backoff_base", "2.0"))
         
+        # Close our connection before forking. A forked child opens its own,
+        # but inherits SQLite's per-process lock state for the file, so this
+        # process would still look like the last connection and, on exit,
+        # checkpoint and delete the WAL while the workers are writing to it.
+        self.storage.close()
+        
+        # Fork on Linux so children don't re-import queuectl; Python 3.14
+        # defaults to forkserver there to avoid forking a multithreaded
+        # parent, but this process runs no threads and holds no SQLite
+        # handle by now. Elsewhere keep the platform default: macOS uses
+        # spawn because forking after system frameworks have started threads
+        # can crash the child. Each child builds its own JobStorage from
+        # db_path rather than sharing this process's storage.
+        if sys.platform.startswith("linux"):
+            ctx = multiprocessing.get_context("fork")
+        else:
+            ctx = multiprocessing.get_context()
+        
+        # Keep a reference: under spawn, children unpickle the queue after
+        # start() returns and its semaphores must still exist
+        self.job_queue = job_queue = ctx.Queue(maxsize=count * 2)
+        self.dispatcher = ctx.Process(
+            target=_dispatcher_process,
+            args=(self.storage.db_path, job_queue, count * 2)
+        )
+        self.dispatcher.start()
+        print(f"Started dispatcher (PID: {self.dispatcher.pid})")
+        
         for i in range(count):
             worker_id = f"worker-{i+1}"
-            process = multiprocessing.Process(
-                target=self._worker_process,
-                args=(worker_id, backoff_base)
+            process = ctx.Process(
+                target=_worker_process,
+                args=(self.storage.db_path, worker_id, backoff_base, job_queue)
             )
             process.start()
             self.processes.append(process)
             print(f"Started {worker_id} (PID: {process.pid})")
     
-    def _worker_process(self, worker_id: str, backoff_base: float):
-        """Worker process entry point."""
-        worker = Worker(worker_id, self.storage, backoff_base)
-        worker.run()
-    
     def stop_workers(self):
         """Stop all worker processes gracefully."""
         if not self.processes:
@@ -150,13 +460,15 @@ class WorkerManager:
         
         print(f"Stopping {len(self.processes)} workers...")
         
-        # Send SIGTERM to all processes
-        for process in self.processes:
+        # Send SIGTERM to all processes. Jobs still waiting in the queue
+        # were never claimed, so they are still pending.
+        processes = self.processes + ([self.dispatcher] if self.dispatcher else [])
+        for process in processes:
             if process.is_alive():
                 process.terminate()
         
         # Wait for graceful shutdown (max 30 seconds)
-        for process in self.processes:
+        for process in processes:
             process.join(timeout=30)
             if process.is_alive():
                 print(f"Force killing worker {process.pid}")
@@ -164,5 +476,7 @@ class WorkerManager:
                 process.join()
         
         self.processes = []
+        self.dispatcher = None
+        self.job_queue = None
         print("All workers stopped")
 
@@ -10,6 +10,9 @@ setup(
         "click>=8.1.0",
         "tabulate>=0.9.0",
     ],
+    extras_require={
+        "fast": ["orjson>=3.0"],
+    },
     entry_points={
         "console_scripts": [
             "queuectl=queuectl.cli:main",
@@ -7,29 +7,101 @@ import subprocess
 import time
 import os
 import sys
+import glob
+import signal
+import tempfile
 import json
 import sqlite3
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
 
+from click.testing import CliRunner
 
-def run_command(cmd, check=True):
-    """Run a CLI command and return output."""
+from queuectl import cli as qcli
+from queuectl.storage import JobStorage, SCHEMA_VERSION, now_ms
+from queuectl.worker import notify_workers
+
+
+# The interpreter running this script, not whatever `python` is on PATH
+CLI = [sys.executable, '-m', 'queuectl.cli']
+
+# The test databases are deleted afterwards, so skip fsyncs entirely. This
+# covers in-process commands and, through _env(), the worker processes.
+os.environ.setdefault("QUEUECTL_SYNCHRONOUS", "OFF")
+
+# Upper bounds (seconds) for waits; tests move on as soon as the condition
+# holds. QUEUECTL_FAST_TESTS=1 tightens them for quick local runs. Worker
+# exit keeps 5s either way to cover the dispatcher's 2s idle backoff.
+FAST = os.environ.get("QUEUECTL_FAST_TESTS") == "1"
+TIMEOUTS = {
+    "job_complete": 5 if FAST else 15,
+    "retry_dlq": 8 if FAST else 20,
+    "multi_worker": 5 if FAST else 15,
+    "worker_exit": 5,
+}
+
+# click < 8.2 mixes stderr into stdout unless told otherwise
+try:
+    _runner = CliRunner(mix_stderr=False)
+except TypeError:
+    _runner = CliRunner()
+
+# Tests run concurrently, each against its own database. CliRunner swaps
+# sys.stdout while a command runs and in-process commands share qcli's
+# globals, so they take turns under _cli_lock and test output is written to
+# the original stdout.
+_STDOUT = sys.stdout
+_cli_lock = threading.RLock()
+_storages = {}
+
+
+def log(*args):
+    """Print a line of test output."""
+    print(*args, file=_STDOUT, flush=True)
+
+
+def _storage(db_path):
+    """Return the JobStorage used by in-process commands for db_path."""
+    with _cli_lock:
+        if db_path not in _storages:
+            _storages[db_path] = JobStorage(db_path)
+        return _storages[db_path]
+
+
+def _env(db_path):
+    """Environment pointing queuectl subprocesses at db_path."""
+    return {**os.environ, "QUEUECTL_DB": db_path}
+
+
+def run_command(cmd, db_path, check=True, input=None):
+    """Run a CLI command (an argv list) against db_path and return output.
+    
+    input, if given, is passed to the command's stdin.
+    
+    queuectl commands run in-process through click's test runner instead of
+    paying an interpreter start per call. Workers are still started with
+    Popen, since they must outlive the command.
+    """
+    if cmd[:len(CLI)] == CLI:
+        with _cli_lock:
+            qcli.storage = _storage(db_path)
+            qcli.worker_manager = None
+            result = _runner.invoke(qcli.cli, cmd[len(CLI):], input=input)
+        return result.exit_code == 0, result.stdout, result.stderr
+    
     try:
-        # On Windows, use list format for better compatibility
-        if isinstance(cmd, str):
-            result = subprocess.run(
-                cmd,
-                shell=True,
-                capture_output=True,
-                text=True,
-                check=check
-            )
-        else:
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                check=check
-            )
+        # Always an argv list: no shell in between, and no quoting to get
+        # right for JSON arguments
+        result = subprocess.run(
+            cmd,
+            capture_output=True,
+            text=True,
+            check=check,
+            input=input,
+            env=_env(db_path)
+        )
         return result.returncode == 0, result.stdout, result.stderr
     except subprocess.CalledProcessError as e:
         return False, e.stdout if e.stdout else "", e.stderr if e.stderr else ""
@@ -37,233 +109,280 @@ def run_command(cmd, check=True):
         return False, "", str(e)
 
 
-def test_basic_job_completion():
+_CONNS = {}
+# Tests 1-3 share a database, so their threads may ask for it at once
+_conns_lock = threading.Lock()
+
+
+def _get_conn(db_path):
+    """Return the script's shared connection to db_path, opening it once."""
+    with _conns_lock:
+        conn = _CONNS.get(db_path)
+        if conn is None:
+            # Opened by the test's thread, closed from the main one in cleanup().
+            # mode=rw fails on a missing database instead of creating an empty one.
+            conn = sqlite3.connect(f"file:{db_path}?mode=rw", uri=True,
+                                   isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute("PRAGMA busy_timeout=5000")
+            _CONNS[db_path] = conn
+        return conn
+
+
+def _close_conns():
+    with _conns_lock:
+        for conn in _CONNS.values():
+            conn.close()
+        _CONNS.clear()
+
+
+# One worker pool, started on first use, serves every test that needs
+# workers; it runs until cleanup()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def _ensure_worker(db_path, count=3):
+    """Start the shared worker pool on db_path unless it is already running."""
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = subprocess.Popen(
+                [*CLI, 'worker', 'start', '--count', str(count)],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                env=_env(db_path)
+            )
+
+
+def _await_exit(process, timeout=TIMEOUTS["worker_exit"]):
+    """Wait for process to exit, killing it if it outlives timeout seconds."""
+    try:
+        process.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def _stop_worker():
+    """Stop the shared worker pool, if it was started."""
+    global _worker
+    if _worker is None:
+        return
+    # SIGTERM makes `worker start` stop its children
+    _worker.terminate()
+    _await_exit(_worker)
+    _worker = None
+
+
+def _seed_jobs(db_path, rows):
+    """Insert job rows (dicts) directly, in a single transaction.
+    
+    Each row needs id, command, state, attempts and max_retries; both
+    timestamps are set to now, in Unix milliseconds like the app's.
+    """
+    _storage(db_path)  # The schema may not exist yet
+    now = now_ms()
+    conn = _get_conn(db_path)
+    conn.execute("BEGIN")
+    try:
+        conn.executemany("""
+            INSERT OR REPLACE INTO jobs
+            (id, command, state, attempts, max_retries, created_at, updated_at)
+            VALUES (:id, :command, :state, :attempts, :max_retries, :now, :now)
+        """, [dict(row, now=now) for row in rows])
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def wait_until(predicate, timeout, interval=0.05):
+    """Poll predicate until it returns true or timeout seconds pass."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(interval)
+    return False
+
+
+def _query_state(db_path, job_id):
+    """Return a job's state straight from the database, or None."""
+    row = _get_conn(db_path).execute("SELECT state FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return row[0] if row else None
+
+
+def _job_states(db_path, job_ids):
+    """Return {id: state} for those of job_ids that exist, in one query."""
+    placeholders = ",".join("?" * len(job_ids))
+    return dict(_get_conn(db_path).execute(
+        f"SELECT id, state FROM jobs WHERE id IN ({placeholders})", job_ids
+    ).fetchall())
+
+
+def test_basic_job_completion(db_path):
     """Test 1: Basic job completes successfully."""
-    print("\n=== Test 1: Basic Job Completion ===")
+    log("\n=== Test 1: Basic Job Completion ===")
     
-    # Enqueue a simple job - use list format to avoid shell quote issues
-    job_data = '{"id":"test1","command":"echo Hello World"}'
+    # Enqueue a simple job
+    job_data = json.dumps({"id": "test1", "command": "echo Hello World"})
     success, stdout, stderr = run_command(
-        ['python', '-m', 'queuectl.cli', 'enqueue', job_data]
+        [*CLI, 'enqueue', job_data], db_path
     )
     
     if not success:
-        print(f"FAILED: Could not enqueue job: {stderr}")
+        log(f"FAILED: Could not enqueue job: {stderr}")
         return False
     
-    # Start a worker
-    worker_process = subprocess.Popen(
-        ['python', '-m', 'queuectl.cli', 'worker', 'start', '--count', '1'],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE
-    )
-    
-    time.sleep(2)  # Wait for job to complete
+    _ensure_worker(db_path)
     
-    # Check status - use list format
-    success, stdout, stderr = run_command(['python', '-m', 'queuectl.cli', 'status'])
+    if not wait_until(lambda: _query_state(db_path, 'test1') == 'completed', TIMEOUTS["job_complete"]):
+        log(f"FAILED: Job did not complete. State: {_query_state(db_path, 'test1')}")
+        return False
     
-    # Stop worker - use list format
-    run_command(['python', '-m', 'queuectl.cli', 'worker', 'stop'], check=False)
-    worker_process.terminate()
-    worker_process.wait()
+    # Check status
+    success, stdout, stderr = run_command([*CLI, 'status'], db_path)
     
-    if "completed" in stdout.lower() or "test1" in stdout:
-        print("PASSED: Job completed successfully")
+    if success:
+        log("PASSED: Job completed successfully")
         return True
     else:
-        print(f"FAILED: Job did not complete. Output: {stdout}")
+        log(f"FAILED: Could not get status: {stderr}")
         return False
 
 
-def test_failed_job_retry():
+def test_failed_job_retry(db_path):
     """Test 2: Failed job retries with backoff and moves to DLQ."""
-    print("\n=== Test 2: Failed Job Retry and DLQ ===")
+    log("\n=== Test 2: Failed Job Retry and DLQ ===")
     
-    # Make sure no workers are running from previous tests
-    run_command(['python', '-m', 'queuectl.cli', 'worker', 'stop'], check=False)
-    time.sleep(1)  # Give workers time to stop
-    
-    # Enqueue a job that will fail - use list format to avoid shell quote issues
-    job_data = '{"id":"test2","command":"nonexistentcommand123","max_retries":2}'
+    # Enqueue a job that will fail
+    job_data = json.dumps({"id": "test2", "command": "nonexistentcommand123", "max_retries": 2})
     success, stdout, stderr = run_command(
-        ['python', '-m', 'queuectl.cli', 'enqueue', job_data]
+        [*CLI, 'enqueue', job_data], db_path
     )
     
     if not success:
-        print(f"FAILED: Could not enqueue job: {stderr}")
+        log(f"FAILED: Could not enqueue job: {stderr}")
         return False
     
-    # Start a worker
-    worker_process = subprocess.Popen(
-        ['python', '-m', 'queuectl.cli', 'worker', 'start', '--count', '1'],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE
-    )
+    _ensure_worker(db_path)
     
-    # Wait for retries to complete (with backoff: 2^1=2s, 2^2=4s = ~6s + buffer)
-    time.sleep(12)
+    # Wait for retries to complete (with backoff: 2^1=2s before the last attempt)
+    if not wait_until(lambda: _query_state(db_path, 'test2') == 'dead', TIMEOUTS["retry_dlq"]):
+        log(f"FAILED: Job did not reach DLQ. State: {_query_state(db_path, 'test2')}")
+        return False
     
-    # Stop worker - use list format
-    run_command(['python', '-m', 'queuectl.cli', 'worker', 'stop'], check=False)
-    worker_process.terminate()
-    worker_process.wait()
-    time.sleep(1)  # Give worker time to stop
+    # Check DLQ
+    success, stdout, stderr = run_command([*CLI, 'dlq', 'list', '--json'], db_path)
     
-    # Check DLQ - use list format
-    success, stdout, stderr = run_command(['python', '-m', 'queuectl.cli', 'dlq', 'list'])
+    jobs = [job for job in json.loads(stdout) if job["id"] == "test2"] if success else []
+    if not jobs:
+        log(f"FAILED: Job not in DLQ. Output: {stdout}")
+        return False
     
-    if "test2" in stdout:
-        print("PASSED: Failed job moved to DLQ after retries")
-        return True
-    else:
-        print(f"FAILED: Job not in DLQ. Output: {stdout}")
+    # Timestamps are ISO-8601 UTC strings, as documented, not stored integers
+    try:
+        time.strptime(jobs[0]["updated_at"], "%Y-%m-%dT%H:%M:%SZ")
+    except (TypeError, ValueError):
+        log(f"FAILED: DLQ JSON timestamp not ISO-8601: {jobs[0]['updated_at']!r}")
         return False
+    
+    log("PASSED: Failed job moved to DLQ after retries")
+    return True
 
 
-def test_multiple_workers():
+def test_multiple_workers(db_path):
     """Test 3: Multiple workers process jobs without overlap."""
-    print("\n=== Test 3: Multiple Workers ===")
-    
-    # Make sure no workers are running from previous tests
-    run_command(['python', '-m', 'queuectl.cli', 'worker', 'stop'], check=False)
-    time.sleep(1)  # Give workers time to stop
-    
-    # Enqueue multiple jobs - use simple echo command (works on all platforms)
-    for i in range(5):
-        # Use a simple command that works on Windows and Unix
-        job_data = f'{{"id":"test3_{i}","command":"echo Job test3_{i} completed"}}'
-        success, stdout, stderr = run_command(
-            ['python', '-m', 'queuectl.cli', 'enqueue', job_data]
-        )
-        if not success:
-            print(f"WARNING: Failed to enqueue test3_{i}: {stderr}")
-    
-    # Verify jobs were enqueued
-    success, stdout, stderr = run_command(['python', '-m', 'queuectl.cli', 'list', '--state', 'pending'])
-    pending_count = stdout.count("test3_")
-    if pending_count < 5:
-        print(f"WARNING: Only {pending_count}/5 jobs enqueued")
-    
-    # Start 3 workers
-    worker_process = subprocess.Popen(
-        ['python', '-m', 'queuectl.cli', 'worker', 'start', '--count', '3'],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE
-    )
-    
-    # Wait longer for jobs to complete (5 jobs with 3 workers = ~2 seconds, but add buffer)
-    time.sleep(8)
-    
-    # Stop workers - use list format
-    run_command(['python', '-m', 'queuectl.cli', 'worker', 'stop'], check=False)
-    worker_process.terminate()
-    worker_process.wait()
-    time.sleep(1)  # Give workers time to stop
-    
-    # Check that jobs were processed - use list format
-    success, stdout, stderr = run_command(['python', '-m', 'queuectl.cli', 'list', '--state', 'completed'])
-    
-    completed_count = stdout.count("test3_")
-    
-    if completed_count >= 3:  # At least some jobs completed
-        print(f"PASSED: Multiple workers processed jobs (completed: {completed_count}/5)")
-        return True
-    else:
-        print(f"FAILED: Not enough jobs completed (found: {completed_count}/5). Output: {stdout}")
+    log("\n=== Test 3: Multiple Workers ===")
+    
+    # Enqueue multiple jobs in one transaction - use simple echo command (works on all platforms)
+    job_ids = [f"test3_{i}" for i in range(5)]
+    _seed_jobs(db_path, [
+        {"id": job_id, "command": f"echo Job {job_id} completed",
+         "state": "pending", "attempts": 0, "max_retries": 3}
+        for job_id in job_ids
+    ])
+    notify_workers(db_path)
+    
+    # Verify jobs were enqueued (the shared workers may already be running them)
+    enqueued_count = len(_job_states(db_path, job_ids))
+    if enqueued_count < 5:
+        log(f"WARNING: Only {enqueued_count}/5 jobs enqueued")
+    
+    # Uses the shared pool of 3 workers
+    _ensure_worker(db_path)
+    
+    def completed(states):
+        return sum(1 for state in states.values() if state == 'completed')
+    
+    if not wait_until(lambda: completed(_job_states(db_path, job_ids)) >= 5, TIMEOUTS["multi_worker"]):
+        states = _job_states(db_path, job_ids)
+        log(f"FAILED: Not all jobs completed (found: {completed(states)}/5). States: {states}")
         return False
+    
+    log("PASSED: Multiple workers processed jobs (completed: 5/5)")
+    return True
 
 
-def test_persistence():
+def test_persistence(db_path):
     """Test 4: Job data survives restart."""
-    print("\n=== Test 4: Persistence ===")
-    
-    # Make sure no workers are running from previous tests
-    run_command(['python', '-m', 'queuectl.cli', 'worker', 'stop'], check=False)
-    time.sleep(2)  # Give workers more time to fully stop
+    log("\n=== Test 4: Persistence ===")
     
     # Use a unique job ID to avoid conflicts with previous tests
     job_id = 'test4_persistence'
-    job_data = f'{{"id":"{job_id}","command":"echo Persistence Test"}}'
+    job_data = json.dumps({"id": job_id, "command": "echo Persistence Test"})
     success, stdout, stderr = run_command(
-        ['python', '-m', 'queuectl.cli', 'enqueue', job_data]
+        [*CLI, 'enqueue', job_data], db_path
     )
     
     if not success:
-        print(f"FAILED: Could not enqueue job: {stderr}")
+        log(f"FAILED: Could not enqueue job: {stderr}")
         return False
     
-    # Small delay to ensure job is written to database
-    time.sleep(0.5)
-    
     # Check job exists in database directly (not via CLI to avoid processing)
-    if os.path.exists("queuectl.db"):
-        conn = sqlite3.connect("queuectl.db")
-        cursor = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
-        row = cursor.fetchone()
-        conn.close()
-        
-        if row:
-            # Job exists in database - that's what we're testing (persistence)
-            print("PASSED: Job persisted in database")
-            return True
-        else:
-            print("FAILED: Job not found in database")
-            return False
+    row = _get_conn(db_path).execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    
+    if row:
+        # Job exists in database - that's what we're testing (persistence)
+        log("PASSED: Job persisted in database")
+        return True
     else:
-        print("FAILED: Database file not found")
+        log("FAILED: Job not found in database")
         return False
 
 
-def test_dlq_retry():
+def test_dlq_retry(db_path):
     """Test 5: DLQ retry functionality."""
-    print("\n=== Test 5: DLQ Retry ===")
-    
-    # Make sure no workers are running from previous tests
-    run_command(['python', '-m', 'queuectl.cli', 'worker', 'stop'], check=False)
-    time.sleep(2)  # Give workers time to fully stop
+    log("\n=== Test 5: DLQ Retry ===")
     
     # Use a unique job ID to avoid conflicts
     job_id = 'test5_dlq_retry'
     
     # First, create a job in DLQ (manually via database)
-    if os.path.exists("queuectl.db"):
-        conn = sqlite3.connect("queuectl.db")
-        conn.execute("""
-            INSERT OR REPLACE INTO jobs 
-            (id, command, state, attempts, max_retries, created_at, updated_at)
-            VALUES 
-            (?, 'echo DLQ Retry Test', 'dead', 3, 3, datetime('now'), datetime('now'))
-        """, (job_id,))
-        conn.commit()
-        conn.close()
-    else:
-        print("FAILED: Database file not found")
-        return False
+    _seed_jobs(db_path, [{"id": job_id, "command": "echo DLQ Retry Test",
+                          "state": "dead", "attempts": 3, "max_retries": 3}])
     
     # Verify job is in DLQ
-    conn = sqlite3.connect("queuectl.db")
-    cursor = conn.execute("SELECT state FROM jobs WHERE id = ?", (job_id,))
-    row = cursor.fetchone()
-    conn.close()
+    row = _get_conn(db_path).execute("SELECT state FROM jobs WHERE id = ?", (job_id,)).fetchone()
     
     if not row or row[0] != 'dead':
-        print(f"FAILED: Job not in DLQ state. State: {row[0] if row else 'not found'}")
+        log(f"FAILED: Job not in DLQ state. State: {row[0] if row else 'not found'}")
         return False
     
-    # Retry from DLQ - use list format
-    success, stdout, stderr = run_command(['python', '-m', 'queuectl.cli', 'dlq', 'retry', job_id])
+    # Retry from DLQ through the CLI: this is the test covering `dlq retry`,
+    # so the transition isn't done in SQL here. It runs in-process, and no
+    # worker uses this test's database, so the job stays pending to observe.
+    success, stdout, stderr = run_command([*CLI, 'dlq', 'retry', job_id], db_path)
     
     if not success:
-        print(f"FAILED: Could not retry DLQ job: {stderr}")
+        log(f"FAILED: Could not retry DLQ job: {stderr}")
         return False
     
     # Check job state immediately after retry (before any worker can process it)
     # We need to check very quickly to catch it in pending state
-    conn = sqlite3.connect("queuectl.db")
-    cursor = conn.execute("SELECT state, attempts FROM jobs WHERE id = ?", (job_id,))
-    row = cursor.fetchone()
-    conn.close()
+    row = _get_conn(db_path).execute("SELECT state, attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()
     
     # The job should be in pending state with attempts reset to 0
     # If it's already completed, that means a worker processed it very quickly,
@@ -273,25 +392,189 @@ def test_dlq_retry():
         attempts = row[1]
         
         if state == 'pending' and attempts == 0:
-            print("PASSED: DLQ retry moved job back to pending with reset attempts")
+            log("PASSED: DLQ retry moved job back to pending with reset attempts")
             return True
         elif state == 'completed' and attempts == 0:
             # Job was retried and immediately processed - this also proves retry worked
-            print("PASSED: DLQ retry moved job back to pending and it was processed successfully")
+            log("PASSED: DLQ retry moved job back to pending and it was processed successfully")
             return True
         else:
-            print(f"FAILED: Job not in expected state after retry. State: {state}, Attempts: {attempts}")
+            log(f"FAILED: Job not in expected state after retry. State: {state}, Attempts: {attempts}")
+            return False
+    else:
+        log("FAILED: Job not found in database after retry")
+        return False
+
+
+# Exits a second after SIGTERM or SIGINT, so its worker is still busy when
+# the `worker start` process that forked it has already exited
+SLOW_JOB = """\
+import signal, sys, time
+def stop(signum, frame):
+    time.sleep(1)
+    sys.exit(1)
+signal.signal(signal.SIGTERM, stop)
+signal.signal(signal.SIGINT, stop)
+time.sleep(30)
+"""
+
+
+def test_worker_start_exit(db_path):
+    """Test 6: Workers' writes survive `worker start` exiting first."""
+    log("\n=== Test 6: Worker Start Exit ===")
+    
+    def state():
+        # A fresh connection each time: one held open would keep the WAL
+        # alive and hide the bug this test covers
+        conn = sqlite3.connect(db_path)
+        try:
+            row = conn.execute("SELECT state FROM jobs WHERE id = 'test6'").fetchone()
+            return row[0] if row else None
+        finally:
+            conn.close()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        script = os.path.join(tmp, "slow_job.py")
+        Path(script).write_text(SLOW_JOB)
+        storage = JobStorage(db_path)
+        storage.create_job("test6", f"{sys.executable} {script}")
+        storage.close()
+        
+        # Its own session, so Ctrl-C can be simulated for the whole group
+        process = subprocess.Popen(
+            [*CLI, 'worker', 'start', '--count', '1'],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            env=_env(db_path),
+            start_new_session=True
+        )
+        if not wait_until(lambda: state() == 'processing', TIMEOUTS["job_complete"]):
+            process.terminate()
+            _await_exit(process)
+            log(f"FAILED: Job never started. State: {state()}")
             return False
+        
+        os.killpg(process.pid, signal.SIGINT)
+        _await_exit(process)
+        # The worker returns the interrupted job to pending about a second
+        # after its parent has exited
+        if wait_until(lambda: state() == 'pending', TIMEOUTS["worker_exit"]):
+            log("PASSED: Interrupted job returned to pending after worker start exited")
+            return True
+        log(f"FAILED: Interrupted job's update was lost. State: {state()}")
+        return False
+
+
+def test_enqueue_batch(db_path):
+    """Test 7: enqueue-batch adds a batch in one all-or-nothing transaction."""
+    log("\n=== Test 7: Batch Enqueue ===")
+    
+    def job_ids():
+        return [row[0] for row in _get_conn(db_path).execute("SELECT id FROM jobs ORDER BY id")]
+    
+    # Blank lines are skipped
+    batch = "\n".join([
+        json.dumps({"id": "test7_a", "command": "echo A"}),
+        "",
+        json.dumps({"id": "test7_b", "command": "echo B", "max_retries": 1}),
+    ])
+    success, stdout, stderr = run_command([*CLI, 'enqueue-batch', '-'], db_path, input=batch)
+    
+    if not success or job_ids() != ["test7_a", "test7_b"]:
+        log(f"FAILED: Batch not enqueued. Output: {stdout} {stderr} Jobs: {job_ids()}")
+        return False
+    
+    # A duplicate id fails the batch, and none of its other jobs are added
+    batch = "\n".join([
+        json.dumps({"id": "test7_c", "command": "echo C"}),
+        json.dumps({"id": "test7_a", "command": "echo A again"}),
+    ])
+    success, stdout, stderr = run_command([*CLI, 'enqueue-batch', '-'], db_path, input=batch)
+    
+    if success or job_ids() != ["test7_a", "test7_b"]:
+        log(f"FAILED: Batch with a duplicate id not rolled back. Jobs: {job_ids()}")
+        return False
+    
+    log("PASSED: Batch enqueued atomically; duplicate id rolled back the whole batch")
+    return True
+
+
+def test_timestamp_migration(db_path):
+    """Test 8: A database with the original TEXT timestamps is migrated."""
+    log("\n=== Test 8: Timestamp Migration ===")
+    
+    # The schema and timestamp format queuectl used before user_version
+    conn = sqlite3.connect(db_path)
+    conn.executescript("""
+        CREATE TABLE jobs (
+            id TEXT PRIMARY KEY,
+            command TEXT NOT NULL,
+            state TEXT NOT NULL,
+            attempts INTEGER DEFAULT 0,
+            max_retries INTEGER DEFAULT 3,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL,
+            locked_by TEXT,
+            locked_at TEXT
+        );
+        ALTER TABLE jobs ADD COLUMN retry_at TEXT;
+        INSERT INTO jobs VALUES ('test8', 'echo Old', 'failed', 1, 3,
+            '2025-11-04T10:30:00.250000Z', '2025-11-04T10:31:00Z',
+            NULL, NULL, '2025-11-04T10:32:00Z');
+    """)
+    conn.close()
+    
+    JobStorage(db_path).close()
+    
+    conn = sqlite3.connect(db_path)
+    try:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        row = conn.execute("""
+            SELECT created_at, updated_at, locked_at, retry_at, typeof(created_at)
+            FROM jobs WHERE id = 'test8'
+        """).fetchone()
+    finally:
+        conn.close()
+    
+    # 2025-11-04T10:30:00Z is 1762252200 seconds after the epoch
+    expected = (1762252200250, 1762252260000, None, 1762252320000, "integer")
+    if version == SCHEMA_VERSION and row == expected:
+        log("PASSED: TEXT timestamps migrated to integer milliseconds")
+        return True
     else:
-        print("FAILED: Job not found in database after retry")
+        log(f"FAILED: Migration result unexpected. user_version: {version}, row: {row}")
         return False
 
 
+# Tests 1-3 share one database and the shared worker pool (their job ids
+# don't overlap); tests 4, 5, 7 and 8 use databases no worker touches, and
+# test 6 runs its own workers
+WORKER_DB = "queuectl_test_workers.db"
+
+TESTS = [
+    ("Basic Job Completion", test_basic_job_completion, WORKER_DB),
+    ("Failed Job Retry", test_failed_job_retry, WORKER_DB),
+    ("Multiple Workers", test_multiple_workers, WORKER_DB),
+    ("Persistence", test_persistence, "queuectl_test_persistence.db"),
+    ("DLQ Retry", test_dlq_retry, "queuectl_test_dlq_retry.db"),
+    ("Worker Start Exit", test_worker_start_exit, "queuectl_test_worker_start.db"),
+    ("Batch Enqueue", test_enqueue_batch, "queuectl_test_batch.db"),
+    ("Timestamp Migration", test_timestamp_migration, "queuectl_test_migration.db"),
+]
+
+
+def _remove_db_files():
+    # Each test database plus its -wal, -shm and .notify companions
+    for path in glob.glob("queuectl_test_*.db*"):
+        Path(path).unlink(missing_ok=True)
+
+
 def cleanup():
     """Clean up test data."""
     print("\n=== Cleaning up ===")
-    if os.path.exists("queuectl.db"):
-        os.remove("queuectl.db")
+    _stop_worker()
+    _close_conns()
+    _remove_db_files()
     print("Cleanup complete")
 
 
@@ -301,18 +584,21 @@ def main():
     print("QueueCTL Validation Script")
     print("=" * 50)
     
-    # Clean up any existing database
-    if os.path.exists("queuectl.db"):
-        os.remove("queuectl.db")
+    # Clean up any existing test databases
+    _remove_db_files()
     
-    results = []
+    tally = Counter()
     
     try:
-        results.append(("Basic Job Completion", test_basic_job_completion()))
-        results.append(("Failed Job Retry", test_failed_job_retry()))
-        results.append(("Multiple Workers", test_multiple_workers()))
-        results.append(("Persistence", test_persistence()))
-        results.append(("DLQ Retry", test_dlq_retry()))
+        # The tests are independent, so they run side by side and the suite
+        # takes as long as the slowest one. Results are reported as each
+        # test finishes (via log(), as other tests may be mid-command).
+        with ThreadPoolExecutor(max_workers=len(TESTS)) as executor:
+            futures = {executor.submit(test, db_path): name for name, test, db_path in TESTS}
+            for future in as_completed(futures):
+                result = future.result()
+                tally[result] += 1
+                log(f"{'PASS' if result else 'FAIL'}: {futures[future]}")
     except Exception as e:
         print(f"\nERROR during testing: {e}")
         import traceback
@@ -326,12 +612,9 @@ def main():
         print("Test Summary")
         print("=" * 50)
         
-        passed = sum(1 for _, result in results if result)
-        total = len(results)
-        
-        for name, result in results:
-            status = "PASS" if result else "FAIL"
-            print(f"{status}: {name}")
+        # Tests that raised, or never ran, count as failed
+        passed = tally[True]
+        total = len(TESTS)
         
         print(f"\nTotal: {passed}/{total} tests passed")
         